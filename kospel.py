@@ -1,16 +1,35 @@
 """AppDaemon script for Home Assistant
 Integration with Kospel electric heaters
 """
-from datetime import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, time
 from enum import Enum
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import multiprocessing
+import os
+import queue
+import random
 import re
-from threading import Lock
+import secrets
+import signal
+from threading import Lock, Thread
+from time import monotonic, time_ns
+from types import MappingProxyType
+from urllib.request import Request, urlopen
 from selenium import webdriver
 from selenium.common.exceptions import (
     NoSuchElementException,
     NoSuchAttributeException,
     TimeoutException,
     ElementNotInteractableException,
+    JavascriptException,
+    StaleElementReferenceException,
+    WebDriverException,
 )
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
@@ -92,101 +111,560 @@ class Kospel(hass.Hass):
         },
     }
 
+    DIAGNOSTICS = {
+        "cycle_duration": {
+            "device_class": "duration",
+            "friendly_name": "Cycle duration",
+            "unit_of_measurement": "s",
+            "icon": "mdi:timer-outline",
+            "entity_category": "diagnostic",
+        },
+        "cycle_p95": {
+            "device_class": "duration",
+            "friendly_name": "Cycle duration (95th percentile)",
+            "unit_of_measurement": "s",
+            "icon": "mdi:timer-outline",
+            "entity_category": "diagnostic",
+        },
+        "success_rate": {
+            "friendly_name": "Cycle success rate",
+            "unit_of_measurement": "%",
+            "icon": "mdi:check-circle-outline",
+            "entity_category": "diagnostic",
+        },
+        "last_success_age": {
+            "device_class": "duration",
+            "friendly_name": "Time since last successful cycle",
+            "unit_of_measurement": "s",
+            "icon": "mdi:clock-alert-outline",
+            "entity_category": "diagnostic",
+        },
+    }
+
     def initialize(self):
         """Runs once at start"""
         self.name = "kospel"
         self.raw_status = None
         self.raw_params = None
 
-        self.web_scrap = WebScrap(
-            self.args["url"],
-            self.args["username"],
-            self.args["password"],
-            self.args["exec_path"],
-            self.log,
-        )
+        # Attributes of every entity, read-only so that they are shared
+        # safely between devices and cycles
+        self.entity_attributes = {
+            sensor: MappingProxyType(dict(attributes))
+            for group in (
+                self.SENSORS,
+                self.STATUSES,
+                self.SETTINGS,
+                self.DIAGNOSTICS,
+            )
+            for sensor, attributes in group.items()
+        }
+
+        # Last state written per entity. Unchanged states are written again
+        # only after publish_refresh seconds (0 writes every time)
+        self.published = {}
+        self.publish_refresh = self.args.get("publish_refresh", 600)
+
+        # Cycle durations and outcomes per device, for diagnostics
+        window = self.args.get("stats_window", 100)
+        self.cycle_stats = LatencyStats(window)
+        self.outcomes = {}
+        self.last_success = {}
+
+        # Entities keep last values for grace_period seconds of failures
+        self.grace_period = self.args.get("grace_period", 180)
+        self.panel_updated = {}
+
+        # Root span of the cycle per device, ended once results are published
+        self.cycle_spans = {}
+        if self.args.get("trace_file"):
+            TRACER.exporter = FileSpanExporter(self.args["trace_file"])
+        elif self.args.get("trace_endpoint"):
+            TRACER.exporter = OtlpSpanExporter(self.args["trace_endpoint"], self.log)
+
+        # Scraper per device. Name is the prefix of its entities
+        devices = self.args.get("devices")
+        if devices:
+            configs = {}
+            for device in devices:
+                config = {**self.args, **device}
+                for option in ("session_file", "tuning_file"):
+                    if self.args.get(option) and option not in device:
+                        # Each device keeps its own session and wait times
+                        config[option] = f"{self.args[option]}.{device['name']}"
+                configs[f"{self.name}_{device['name']}"] = config
+        else:
+            configs = {self.name: self.args}
+        self.scrapers = {
+            name: self._build_scraper(config) for name, config in configs.items()
+        }
+        self.web_scrap = next(iter(self.scrapers.values()))
+        for name in self.scrapers:
+            self.outcomes[name] = deque(maxlen=window)
+
+        # Panel which keeps failing is left alone for a while
+        self.urls = {name: config["url"] for name, config in configs.items()}
+        self.breakers = {
+            name: CircuitBreaker(
+                name,
+                self.log,
+                threshold=self.args.get("breaker_threshold", 3),
+                backoff=self.args.get("breaker_backoff", 60),
+                max_backoff=self.args.get("breaker_backoff_max", 1800),
+            )
+            for name in self.scrapers
+        }
+
+        # Scraping in own threads keeps AppDaemon's worker threads free
+        self.background = self.args.get("background", False)
+        self.executor = None
+        self.pending = {}
+        if self.background or len(self.scrapers) > 1:
+            workers = self.args.get("workers", 4) if len(self.scrapers) > 1 else 1
+            self.executor = ThreadPoolExecutor(
+                max_workers=min(workers, len(self.scrapers)),
+                thread_name_prefix="kospel",
+            )
+
+        self.metrics_server = None
+        if self.args.get("metrics_port"):
+            self.metrics_server = serve_metrics(
+                self.args["metrics_port"], self.args.get("metrics_host", "127.0.0.1")
+            )
+
+        # Heater activity per device drives adaptive polling
+        self.activity = {}
+        self.poll_interval = self.args.get("poll_interval", 60)
+        self.adaptive_polling = self.args.get("adaptive_polling", False)
+        # Devices of the current cycle whose results are not published yet
+        self.poll_awaiting = set()
+        self.poll_guard = None
 
         self.log("Initialized")
-        self.run_minutely(self.read_data, time(0, 0, 31))
+
+        # Fresh data on demand, e.g. after changing a setting on the panel
+        self.listen_event(self.refresh_requested, "kospel_refresh")
+        # Home Assistant restarted and forgot our entities
+        self.listen_event(self.ha_restarted, "plugin_started")
+
+        if self.adaptive_polling:
+            self.run_in(self.poll, 0)
+        else:
+            self.run_minutely(self.read_data, time(0, 0, 31))
+
+    def refresh_requested(self, event_name, data, kwargs):
+        """Handles kospel_refresh event
+
+        Event data (both optional):
+            group: "status", "settings" or "params"; all when not given
+            device: name of the device in fleet mode; all when not given
+        """
+        group = data.get("group")
+        if group is not None and group not in RefreshTiers.GROUPS:
+            self.log(f"Unknown data group {group}")
+            return
+
+        device = data.get("device")
+        for name, scraper in self.scrapers.items():
+            if device is None or name in (device, f"{self.name}_{device}"):
+                scraper.refresh(group)
+        self.run_in(self.read_data, 0)
+
+    def ha_restarted(self, event_name, data, kwargs):
+        """Handles plugin_started event
+
+        Entities are written again on the next cycle, changed or not
+        """
+        self.log("Home Assistant restarted")
+        self.published.clear()
+
+    def poll(self, kwargs=None):
+        """Starts a cycle (adaptive polling)
+
+        The next one is scheduled by _schedule_poll() once results of
+        all devices are published
+        """
+        self.poll_awaiting = set(self.scrapers)
+        # In case the results never get published
+        self.poll_guard = self.run_in(self.poll, self.args.get("poll_max", 900))
+        self.run_in(self.read_data, 0)
+
+    def _schedule_poll(self, name):
+        """Schedules the next cycle according to the one just published"""
+        if not self.adaptive_polling or name not in self.poll_awaiting:
+            return
+        self.poll_awaiting.discard(name)
+        if self.poll_awaiting:
+            return
+
+        self.cancel_timer(self.poll_guard)
+        self.poll_interval = self.next_interval()
+        self.run_in(self.poll, self.poll_interval)
+
+    def next_interval(self):
+        """Seconds until next cycle, according to the latest readouts
+
+        Fast while any heater is active, slowing down while all of them
+        are idle or in vacation mode
+        """
+        default = self.args.get("poll_interval", 60)
+        minimum = self.args.get("poll_min", 15)
+        maximum = self.args.get("poll_max", 900)
+
+        activity = [self.activity.get(name) for name in self.scrapers]
+        if "active" in activity:
+            interval = self.args.get("poll_active", 15)
+        elif all(state == "vacation" for state in activity):
+            interval = maximum
+        elif all(state in ("idle", "vacation") for state in activity):
+            # Back off step by step
+            interval = min(
+                max(self.poll_interval, default) * 2, self.args.get("poll_idle", 300)
+            )
+        else:
+            # Unknown, e.g. after a failure
+            interval = default
+
+        return max(minimum, min(maximum, interval))
+
+    def classify_activity(self, statuses, params):
+        """Tells whether heater is "active", "idle" or in "vacation" mode"""
+        if StateColors.RED in (statuses.get("radiator"), statuses.get("tap")):
+            return "active"
+
+        power = params.get("params_power", "").split(" ")[0]
+        try:
+            if float(power) > 0:
+                return "active"
+        except ValueError:
+            pass
+
+        if statuses.get("suitcase") not in (None, StateColors.WHITE, StateColors.BLACK):
+            return "vacation"
+        return "idle"
+
+    def _build_scraper(self, config):
+        """Creates scraper according to the configuration
+
+        Args:
+            config (dict): App arguments, with device's own arguments in fleet mode
+        """
+        refresh = config.get("refresh") or {}
+        # Isolated scraper is created later, in its process; fail right away
+        RefreshTiers(refresh)
+
+        scrap_class = WebScrap
+        args = (
+            config["url"],
+            config["username"],
+            config["password"],
+            config["exec_path"],
+        )
+        kwargs = {
+            "batched": config.get("batched_read", False),
+            "params_refresh": config.get("params_refresh_script"),
+            "session_file": config.get("session_file"),
+            "standby": config.get("standby_driver", False),
+            "device": config.get("device", 0),
+            "capture_budget": config.get("capture_budget"),
+            # Hashable, as it becomes part of the registry key
+            "refresh": tuple(sorted(refresh.items())),
+            "cycle_budget": config.get("cycle_budget", 50),
+            "tune_waits": config.get("tune_waits", True),
+            "tuning_file": config.get("tuning_file"),
+        }
+
+        isolate = config.get("isolate_process", False)
+        if config.get("capture_dir"):
+            # Created where the scraper lives, so it's left out of the key
+            capture_args = (
+                config["capture_dir"],
+                int(config.get("capture_max_mb", 50) * 1024 * 1024),
+            )
+        else:
+            capture_args = None
+
+        if isolate:
+            timeout = config.get("process_timeout", 120)
+
+            def factory():
+                return ScrapProcess(
+                    scrap_class, args, kwargs, self.log, timeout, capture_args
+                )
+
+        else:
+
+            def factory():
+                if capture_args:
+                    capture = CaptureBuffer(*capture_args, log_function=self.log)
+                    return scrap_class(
+                        *args, log_function=self.log, capture=capture, **kwargs
+                    )
+                return scrap_class(*args, log_function=self.log, **kwargs)
+
+        # Apps with the same configuration share the scraper
+        key = (
+            scrap_class.__name__,
+            args,
+            tuple(sorted(kwargs.items())),
+            isolate,
+            capture_args,
+        )
+        return ScraperRegistry.acquire(key, factory)
 
     def terminate(self):
         """App is reloading. Stop the driver"""
         try:
-            self.web_scrap.stop()
+            if self.executor:
+                self.executor.shutdown(wait=False, cancel_futures=True)
+            for scraper in self.scrapers.values():
+                scraper.close()
+            if self.metrics_server:
+                self.metrics_server.shutdown()
+                self.metrics_server.server_close()
         finally:
-            self.addon_state("off")
+            for name in self.scrapers:
+                # No grace period, values won't be updated anymore
+                self.last_success.pop(name, None)
+                self.addon_state("off", name=name)
 
     def read_data(self, kwargs=None):
         """Fetch update from Kospel Panel"""
         self.log("Reading data")
+        names = self._allowed()
+        self._publish_blocked()
+        if self.executor is None:
+            for name in names:
+                self.process_result(*self.scrape(name), name=name)
+        elif self.background:
+            for name in names:
+                pending = self.pending.get(name)
+                if pending and not pending.done():
+                    self.log(f"Previous cycle of {name} is still running. Skipping")
+                    continue
+
+                self.pending[name] = self.executor.submit(self.scrape, name)
+                self.pending[name].add_done_callback(
+                    lambda future, name=name: self._scrape_done(future, name)
+                )
+        else:
+            # Devices are read concurrently, published one after another
+            futures = {name: self.executor.submit(self.scrape, name) for name in names}
+            for name, future in futures.items():
+                self.process_result(*future.result(), name=name)
+
+    def scrape(self, name):
+        """Runs the scraper and recovers it after a failure
+
+        Args:
+            name (str): Scraper (device) name
+
+        Returns:
+            tuple: (data, error) where data is (statuses, params, settings)
+        """
+        span = self.cycle_spans[name] = TRACER.start("cycle", device=name)
+        with TRACER.use(span):
+            start = monotonic()
+            try:
+                if self._probe_due(name):
+                    with TRACER.span("probe"):
+                        probe_panel(self.urls[name])
+                with TRACER.span("scrape"):
+                    result = self.scrapers[name].run()
+            except Exception as error:
+                return None, self._cycle_failed(name, start, error)
+
+        self._record_cycle(name, monotonic() - start)
+        return result, None
+
+    def _probe_due(self, name):
+        """Panel still down should cost a request, not a new browser"""
+        return self.breakers[name].state == CircuitBreaker.HALF_OPEN
+
+    def _cycle_failed(self, name, start, error):
+        """Records the failure and resets the scraper when that can help
+
+        Returns:
+            Exception: The error
+        """
+        self._record_cycle(name, monotonic() - start, error=error)
+        if isinstance(error, (PanelDown, DeadlineExceeded)):
+            # Fresh driver would not help
+            return error
         try:
-            statuses, params, settings = self.web_scrap.run()
-        except (ConnectionError, ReferenceError) as e:
-            self.log(e)
-            self.addon_state("off")
-            self.web_scrap.reset()
-        except Exception as e:
-            # Something unexpected happened
-            self.log(f"Uncaught exception {e}.")
-            self.addon_state("off")
-            self.web_scrap.reset()
+            with TRACER.span("reset"):
+                self.scrapers[name].reset()
+        except Exception as reset_error:
+            self.log(f"Unable to reset scraper {reset_error}.")
+        return error
+
+    def _allowed(self):
+        """Devices whose circuit breaker lets a cycle through"""
+        return [name for name in self.scrapers if self.breakers[name].allow()]
+
+    def _publish_blocked(self):
+        """Devices with open circuit are not read, but their values age"""
+        for name, breaker in self.breakers.items():
+            if breaker.state == CircuitBreaker.OPEN:
+                self.process_result(
+                    None, ConnectionError(f"Circuit of {name} open"), name=name
+                )
+
+    def _record_cycle(self, name, seconds, error=None):
+        self.cycle_stats.add(name, seconds)
+        self.outcomes[name].append(error is None)
+        METRICS.inc("kospel_cycles_total", device=name)
+        METRICS.observe("kospel_cycle_duration_seconds", seconds, device=name)
+        if error is None:
+            self.last_success[name] = monotonic()
+            self.breakers[name].success()
         else:
-            self.process_params(params)
-            self.process_statuses(statuses)
-            self.process_settings(settings)
-            self.addon_state("on")
-
-    def sensor_state(self, sensor, value, attributes=None):
-        """Update a sensor"""
-        sensor_name = f"sensor.{self.name}_{sensor}"
-
-        # TODO: Factory pattern here!
-        if sensor in self.SENSORS:
-            attributes_update = self.SENSORS.get(sensor, {})
-        elif sensor in self.STATUSES:
-            attributes_update = self.STATUSES.get(sensor, {})
-        elif sensor in self.SETTINGS:
-            attributes_update = self.SETTINGS.get(sensor, {})
+            self.breakers[name].failure()
+            reason = type(error).__name__
+            if not isinstance(error, (ConnectionError, ReferenceError, PermissionError)):
+                reason = "uncaught"
+            METRICS.inc("kospel_cycle_failures_total", device=name, reason=reason)
+
+    def _scrape_done(self, future, name):
+        """Called in executor thread. Hands results over to AppDaemon"""
+        data, error = future.result()
+        # "name" is reserved by run_in() for the scheduler
+        self.run_in(self.publish_data, 0, data=data, error=error, device=name)
+
+    def publish_data(self, kwargs):
+        """Scheduled by _scrape_done()"""
+        self.process_result(kwargs["data"], kwargs["error"], name=kwargs["device"])
+
+    def process_result(self, data, error, name=None):
+        """Publishes scraped data or the failure"""
+        name = name or self.name
+        # Publishing belongs to the trace of the cycle, which ends here
+        span = self.cycle_spans.pop(name, None)
+        with TRACER.use(span), TRACER.span("publish"):
+            self._process_result(data, error, name)
+        if span:
+            span.end(error)
+        self._schedule_poll(name)
+
+    def _process_result(self, data, error, name):
+        if isinstance(error, (ConnectionError, ReferenceError, PermissionError)):
+            self.log(error)
+            self.activity[name] = None
+            self.addon_state("off", name=name)
+        elif error is not None:
+            # Something unexpected happened
+            self.log(f"Uncaught exception {error}.")
+            self.activity[name] = None
+            self.addon_state("off", name=name)
         else:
-            attributes_update = {}
+            statuses, params, settings = data
+            self.panel_updated[name] = datetime.now().isoformat(timespec="seconds")
+            self.activity[name] = self.classify_activity(statuses, params)
+            self.process_params(params, name=name)
+            self.process_statuses(statuses, name=name)
+            self.process_settings(settings, name=name)
+            self.addon_state("on", name=name)
+        self.process_diagnostics(name=name)
+
+    def sensor_state(self, sensor, value, attributes=None, name=None):
+        """Update a sensor
+
+        Args:
+            name (str, optional): Entity prefix of the device. Defaults to app name.
+        """
+        sensor_name = f"sensor.{name or self.name}_{sensor}"
 
+        template = self.entity_attributes.get(sensor, {})
         if attributes:
-            attributes_update.update(attributes)
+            # Dynamic attributes (unit, color) on top of the definition
+            attributes = {**template, **attributes}
+        else:
+            attributes = template
 
-        self.set_state(
-            sensor_name,
-            state=value,
-            attributes=attributes_update,
-        )
+        self._write_state(sensor_name, value, attributes)
 
-    def reset(self):
+    def reset(self, name=None):
         """Sets all statuses to default state"""
         for item in [*self.SENSORS, *self.STATUSES, *self.SETTINGS]:
-            self.sensor_state(item, "Unavailable")
+            self.sensor_state(item, "Unavailable", name=name)
 
-    def addon_state(self, state):
-        """Update state of the addon"""
+    def mark_stale(self, name=None):
+        """Keeps last values of all statuses, marked as stale"""
+        name = name or self.name
+        for item in [*self.SENSORS, *self.STATUSES, *self.SETTINGS]:
+            entity_id = f"sensor.{name}_{item}"
+            last = self.published.get(entity_id)
+            if last is None:
+                continue
+            state, attributes, _ = last
+            attributes = {
+                **attributes,
+                "stale": True,
+                "last_updated_panel": self.panel_updated.get(name),
+            }
+            self._write_state(entity_id, state, attributes)
+
+    def addon_state(self, state, name=None):
+        """Update state of the addon
+
+        After a failure entities keep their last values (marked as stale)
+        until grace_period passes since the last successful cycle
+        """
+        name = name or self.name
+        attributes = {"stale": False}
         if state == "off":
             # Most probably there was some web scrap error
-            # Set this to go through entire login process again
-            self.web_scrap.stop()
-            self.reset()
+            # Scraper is reset by the caller
+            last_success = self.last_success.get(name)
+            if (
+                last_success is not None
+                and monotonic() - last_success < self.grace_period
+            ):
+                attributes["stale"] = True
+                self.mark_stale(name=name)
+            else:
+                self.reset(name=name)
+            attributes["last_updated_panel"] = self.panel_updated.get(name)
             color = StateColors.RED
         else:
             color = StateColors.GREEN
 
-        self.set_state(
-            f"{self.name}.state",
-            state=state,
-            attributes={"rgb_color": self.get_rgb(color)},
-        )
-
-    def process_params(self, params):
+        attributes["rgb_color"] = self.get_rgb(color)
+        # kospel.state, in fleet mode kospel.<device>_state
+        if name == self.name:
+            object_id = "state"
+        else:
+            object_id = f"{name[len(self.name) + 1 :]}_state"
+        self._write_state(f"{self.name}.{object_id}", state, attributes)
+
+    def _write_state(self, entity_id, state, attributes):
+        """Sets state in Home Assistant, unless it has not changed"""
+        now = monotonic()
+        attributes = attributes or {}
+        last = self.published.get(entity_id)
+        if (
+            last is not None
+            and last[0] == state
+            and last[1] == attributes
+            and now - last[2] < self.publish_refresh
+        ):
+            METRICS.inc("kospel_set_state_skipped_total")
+            return
+        # Home Assistant gets a plain dict, also kept for the comparison
+        attributes = dict(attributes)
+        self.published[entity_id] = (state, attributes, now)
+
+        METRICS.inc("kospel_set_state_total")
+        with TRACER.span("set_state", entity_id=entity_id):
+            self.set_state(entity_id, state=state, attributes=attributes)
+
+    def process_params(self, params, name=None):
         """Processes raw data from web scraper
         Look for values expected according to sensor definition
 
         Args:
             params (dict): Parameters raw values
+            name (str, optional): Entity prefix of the device
         """
         for item in self.SENSORS:
             # Look for the value
@@ -205,14 +683,17 @@ class Kospel(hass.Hass):
             value = float(value)
 
             # Update sensor
-            self.sensor_state(item, value, attributes={"unit_of_measurement": unit})
+            self.sensor_state(
+                item, value, attributes={"unit_of_measurement": unit}, name=name
+            )
 
-    def process_settings(self, settings):
+    def process_settings(self, settings, name=None):
         """Processes raw data from web scraper
         Look for values expected according to settings definition
 
         Args:
             params (dict): Settings raw values
+            name (str, optional): Entity prefix of the device
         """
         for item in self.SETTINGS:
             readout = settings.get(item)
@@ -229,13 +710,14 @@ class Kospel(hass.Hass):
             value = float(readout)
 
             # Update sensor
-            self.sensor_state(item, value)
+            self.sensor_state(item, value, name=name)
 
-    def process_statuses(self, statuses):
+    def process_statuses(self, statuses, name=None):
         """Process value of status icons
 
         Args:
             statuses (dics): statuses color codes
+            name (str, optional): Entity prefix of the device
         """
         for item in self.STATUSES:
             rgb_color = statuses.get(item)
@@ -258,9 +740,42 @@ class Kospel(hass.Hass):
                 description = "unknown"
 
             self.sensor_state(
-                item, description, attributes={"rgb_color": self.get_rgb(rgb_color)}
+                item,
+                description,
+                attributes={"rgb_color": self.get_rgb(rgb_color)},
+                name=name,
             )
 
+    def process_diagnostics(self, name=None):
+        """Publishes scraper health: cycle durations, success rate, last success
+
+        Args:
+            name (str, optional): Entity prefix of the device
+        """
+        name = name or self.name
+        outcomes = self.outcomes[name]
+        last_success = self.last_success.get(name)
+        values = {
+            "cycle_duration": self.cycle_stats.last(name),
+            "cycle_p95": self.cycle_stats.percentile(name, 95),
+            "success_rate": 100 * sum(outcomes) / len(outcomes) if outcomes else None,
+            "last_success_age": monotonic() - last_success if last_success else None,
+        }
+
+        # Phases are measured by the scraper itself (not available
+        # when it runs in another process)
+        phases = {}
+        stats = getattr(self.scrapers[name], "stats", None)
+        if stats:
+            for phase in stats.phases():
+                phases[f"{phase}_p95"] = round(stats.percentile(phase, 95), 3)
+
+        for item, value in values.items():
+            if value is None:
+                continue
+            attributes = phases if item == "cycle_duration" else None
+            self.sensor_state(item, round(value, 2), attributes=attributes, name=name)
+
     @staticmethod
     def get_rgb(rgb_string):
         """Extracts R G B colors from string
@@ -284,44 +799,855 @@ class StateColors(str, Enum):
     BLACK = "rgb(0, 0, 0)"
 
 
-class SingletonMeta(type):
-    """Source
-    https://refactoring.guru/design-patterns/singleton/python/example#example-1
+class ElementMissing(ReferenceError):
+    """Element not (yet) on the page, reading again may succeed"""
+
+
+class NavigationTimeout(ConnectionError):
+    """Page did not get to the expected state in time"""
+
+
+class SessionExpired(PermissionError):
+    """Panel no longer accepts the session, new login is needed"""
+
+
+class BrowserCrashed(ConnectionError):
+    """WebDriver or the browser stopped responding, it needs a rebuild"""
+
+
+class PanelDown(ConnectionError):
+    """Panel is not reachable at all"""
+
+
+class DeadlineExceeded(ConnectionError):
+    """Cycle used up its time budget"""
+
+    def __init__(self, message, phase=None):
+        super().__init__(message)
+        self.phase = phase
+
 
-    Thread-safe singleton class
+class LatencyStats:
+    """Rolling window of durations per phase"""
+
+    def __init__(self, size=100):
+        self.size = size
+        self.current = {}  # Durations of the ongoing cycle
+        self._samples = {}
+        self._lock = Lock()
+
+    def start_cycle(self):
+        with self._lock:
+            self.current = {}
+
+    def add(self, phase, seconds):
+        with self._lock:
+            if phase not in self._samples:
+                self._samples[phase] = deque(maxlen=self.size)
+            self._samples[phase].append(seconds)
+            self.current[phase] = self.current.get(phase, 0.0) + seconds
+
+    def phases(self):
+        with self._lock:
+            return list(self._samples)
+
+    def last(self, phase):
+        """Most recent duration or None"""
+        with self._lock:
+            samples = self._samples.get(phase)
+            return samples[-1] if samples else None
+
+    def percentile(self, phase, percent):
+        """Nearest-rank percentile of the window or None"""
+        with self._lock:
+            samples = sorted(self._samples.get(phase, ()))
+        if not samples:
+            return None
+        rank = round(percent / 100 * len(samples)) - 1
+        return samples[max(0, min(len(samples) - 1, rank))]
+
+    def count(self, phase):
+        with self._lock:
+            return len(self._samples.get(phase, ()))
+
+    def dump(self):
+        """Samples of all phases, e.g. to be stored"""
+        with self._lock:
+            return {phase: list(samples) for phase, samples in self._samples.items()}
+
+    def load(self, samples):
+        """Replaces samples with the ones from dump()"""
+        with self._lock:
+            self._samples = {
+                phase: deque(values, maxlen=self.size)
+                for phase, values in samples.items()
+            }
+
+
+class RefreshTiers:
+    """Decides which data groups are read in a cycle
+
+    Each group is read every N-th cycle, in between its last values are
+    served from the cache. A group can be also refreshed on demand
     """
 
-    _instances = {}
+    GROUPS = ("status", "settings", "params")
 
-    _lock: Lock = Lock()
+    def __init__(self, every=None):
+        """
+        Args:
+            every (dict, optional): Group => read every that many cycles.
+            Groups not listed are read on every cycle.
+        """
+        every = dict(every or {})
+        unknown = set(every) - set(self.GROUPS)
+        if unknown:
+            raise ValueError(f"Unknown data groups: {', '.join(sorted(unknown))}")
+        self.every = {group: 1 for group in self.GROUPS}
+        self.every.update(every)
+        self.cycle = 0
+        self.cache = {}
+        self.forced = set()
+
+    def start_cycle(self):
+        self.cycle += 1
+
+    def due(self, group):
+        """Should the group be read in the current cycle"""
+        return (
+            group in self.forced
+            or group not in self.cache
+            or self.cycle % max(1, self.every[group]) == 0
+        )
+
+    def store(self, group, values):
+        self.cache[group] = values
+        self.forced.discard(group)
+
+    def refresh(self, group=None):
+        """Reads the group (all groups when None) in the next cycle"""
+        self.forced.update([group] if group else self.GROUPS)
+
+    def result(self):
+        """returns (dict, dict, dict): statuses, parameters and settings"""
+        return self.cache["status"], self.cache["params"], self.cache["settings"]
+
+
+class CircuitBreaker:
+    """Stops cycles against a panel which keeps failing
+
+    After `threshold` failures in a row the circuit opens and no cycles
+    run for the backoff period. Then one trial cycle is let through
+    (half-open): success closes the circuit, failure opens it again for
+    twice as long, up to max_backoff. Backoff periods are jittered
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self, name, log_function=None, threshold=3, backoff=60, max_backoff=1800
+    ):
+        """
+        Args:
+            name (str): Device name, for logs and metrics
+            log_function (function, optional): Logging function. Defaults to None.
+            threshold (int, optional): Failures in a row opening the circuit.
+            backoff (float, optional): First backoff period in seconds.
+            max_backoff (float, optional): Longest backoff period in seconds.
+        """
+        self.name = name
+        self.log = log_function or (lambda x: None)
+        self.threshold = threshold
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.state = self.CLOSED
+        self.failures = 0
+        self.trips = 0
+        self.retry_at = None
+
+    def allow(self):
+        """Can a cycle run now"""
+        if self.state == self.OPEN and monotonic() >= self.retry_at:
+            self.state = self.HALF_OPEN
+            self.log(f"Circuit of {self.name} half-open, trying again")
+        return self.state != self.OPEN
+
+    def success(self):
+        if self.state != self.CLOSED:
+            self.log(f"Circuit of {self.name} closed")
+        self.state = self.CLOSED
+        self.failures = 0
+        self.trips = 0
+
+    def failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+            self._open()
+
+    def _open(self):
+        delay = min(self.max_backoff, self.backoff * 2**self.trips)
+        # Between half and full delay, so devices do not retry in lockstep
+        delay = random.uniform(delay / 2, delay)
+        self.trips += 1
+        self.retry_at = monotonic() + delay
+        self.state = self.OPEN
+        METRICS.inc("kospel_breaker_opened_total", device=self.name)
+        self.log(f"Circuit of {self.name} open, next attempt in {delay:.0f}s")
+
+
+def probe_panel(url, timeout=10):
+    """Cheap check that the panel answers at all
+
+    Raises:
+        ConnectionError: Panel is not reachable or responds with an error
+    """
+    try:
+        with urlopen(url, timeout=timeout) as response:
+            response.read(1)
+    except OSError as error:
+        # URLError and HTTPError included
+        raise PanelDown(f"Panel not available: {error}") from error
+
+
+class Deadline:
+    """Time budget of one cycle, which all its waits draw from"""
+
+    def __init__(self, seconds=None):
+        """
+        Args:
+            seconds (float, optional): Budget. Defaults to None (unlimited).
+        """
+        self.seconds = seconds
+        self.expires = monotonic() + seconds if seconds else None
+
+    def timeout(self, seconds):
+        """Timeout of a wait, cut down to what is left of the budget
+
+        Raises:
+            DeadlineExceeded: Budget is already spent
+        """
+        self.check()
+        if self.expires is None:
+            return seconds
+        return min(seconds, self.expires - monotonic())
+
+    def check(self):
+        """Raises DeadlineExceeded when the budget is spent"""
+        if self.expires is not None and monotonic() >= self.expires:
+            phase = _PHASE.get()
+            METRICS.inc("kospel_deadline_exceeded_total", phase=phase or "unknown")
+            raise DeadlineExceeded(
+                f"Cycle budget of {self.seconds}s spent in {phase}", phase
+            )
+
+
+class WaitTuner:
+    """Timeouts and poll intervals of waits learned from their durations
+
+    Timeout is p99 of the wait durations times FACTOR, but never shorter
+    than the default (a shorter timeout does not speed up a healthy
+    cycle), so it only grows on a slow panel. Poll interval is p10
+    divided by POLL_DIVISOR. Defaults are used until MIN_SAMPLES are
+    collected. Durations can be kept in a file, so that they survive
+    restarts; it is written at most every SAVE_INTERVAL seconds
+    """
+
+    FACTOR = 3
+    POLL_DIVISOR = 4
+    MIN_SAMPLES = 20
+    # Learned values stay within these limits
+    MAX_TIMEOUT_FACTOR = 3  # times the default timeout
+    MIN_POLL = 0.1
+    SAVE_INTERVAL = 600
+
+    def __init__(self, path=None, size=200, enabled=True, log_function=None):
+        """
+        Args:
+            path (str, optional): File to keep durations in. Defaults to None.
+            size (int, optional): Durations kept per wait. Defaults to 200.
+            enabled (bool, optional): When False defaults are always used.
+            log_function (function, optional): Logging function. Defaults to None.
+        """
+        self.path = path
+        self.enabled = enabled
+        self.stats = LatencyStats(size)
+        self.log = log_function or (lambda x: None)
+        self.saved = monotonic()
+        self.load()
+
+    def add(self, wait, seconds):
+        self.stats.add(wait, seconds)
+
+    def timeout(self, wait, default):
+        if not self._learned(wait):
+            return default
+        timeout = self.stats.percentile(wait, 99) * self.FACTOR
+        return min(max(timeout, default), default * self.MAX_TIMEOUT_FACTOR)
+
+    def poll_frequency(self, wait, default):
+        if not self._learned(wait):
+            return default
+        poll = self.stats.percentile(wait, 10) / self.POLL_DIVISOR
+        return min(max(poll, self.MIN_POLL), default)
+
+    def _learned(self, wait):
+        return self.enabled and self.stats.count(wait) >= self.MIN_SAMPLES
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                self.stats.load(json.load(file))
+        except (OSError, ValueError) as error:
+            self.log(f"Unable to read wait durations: {error}")
+
+    def save(self, force=False):
+        """
+        Args:
+            force (bool, optional): Save even if SAVE_INTERVAL hasn't passed.
+        """
+        if not self.path:
+            return
+        if not force and monotonic() - self.saved < self.SAVE_INTERVAL:
+            return
+        self.saved = monotonic()
+        try:
+            temp_file = f"{self.path}.tmp"
+            with open(temp_file, "w", encoding="utf-8") as file:
+                json.dump(self.stats.dump(), file)
+            os.replace(temp_file, self.path)
+        except OSError as error:
+            self.log(f"Unable to save wait durations: {error}")
+
+
+# Innermost @timed phase in progress
+_PHASE = ContextVar("kospel_phase", default=None)
+
+
+def timed(phase):
+    """Records duration of the method in self.stats under the phase name
+    Also traced as a span of that name
+    """
+
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            start = monotonic()
+            token = _PHASE.set(phase)
+            try:
+                with TRACER.span(phase):
+                    return method(self, *args, **kwargs)
+            finally:
+                _PHASE.reset(token)
+                self.stats.add(phase, monotonic() - start)
+
+        return wrapper
+
+    return decorator
+
+
+class Metrics:
+    """Counters and histograms exposed in Prometheus text format"""
+
+    HELP = {
+        "kospel_cycles_total": ("counter", "Scrape cycles"),
+        "kospel_cycle_failures_total": ("counter", "Failed scrape cycles by reason"),
+        "kospel_cycle_duration_seconds": ("histogram", "Scrape cycle duration"),
+        "kospel_driver_rebuilds_total": ("counter", "WebDriver resets"),
+        "kospel_logins_total": ("counter", "Logins to the panel"),
+        "kospel_webdriver_roundtrips_total": ("counter", "WebDriver commands sent"),
+        "kospel_set_state_total": ("counter", "Home Assistant state writes"),
+        "kospel_breaker_opened_total": ("counter", "Circuit breaker openings"),
+        "kospel_recoveries_total": ("counter", "Recovery steps by kind"),
+        "kospel_deadline_exceeded_total": (
+            "counter",
+            "Cycles which used up their time budget, by phase",
+        ),
+        "kospel_set_state_skipped_total": (
+            "counter",
+            "Home Assistant state writes skipped as unchanged",
+        ),
+    }
+
+    BUCKETS = (0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+    def __init__(self):
+        self._counters = {}
+        self._histograms = {}
+        self._lock = Lock()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            # Count per bucket, then sum and count of all observations
+            histogram = self._histograms.setdefault(
+                key, [0] * len(self.BUCKETS) + [0.0, 0]
+            )
+            for index, bound in enumerate(self.BUCKETS):
+                if value <= bound:
+                    histogram[index] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    def drain(self):
+        """Returns recorded values and starts from zero
+
+        returns (dict, dict): counters and histograms, for merge()
+        """
+        with self._lock:
+            counters, self._counters = self._counters, {}
+            histograms, self._histograms = self._histograms, {}
+        return counters, histograms
+
+    def merge(self, counters, histograms):
+        """Adds values drained from another Metrics, e.g. of ScrapProcess"""
+        with self._lock:
+            for key, value in counters.items():
+                self._counters[key] = self._counters.get(key, 0) + value
+            for key, values in histograms.items():
+                histogram = self._histograms.setdefault(
+                    key, [0] * len(self.BUCKETS) + [0.0, 0]
+                )
+                for index, value in enumerate(values):
+                    histogram[index] += value
+
+    def render(self):
+        """Text exposition format"""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: list(value) for key, value in self._histograms.items()}
+
+        lines = []
+        for name, (kind, description) in self.HELP.items():
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{self._labels(labels)} {value}")
+            for (metric, labels), histogram in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                for bound, count in zip(self.BUCKETS, histogram):
+                    bucket_labels = self._labels(labels + (("le", str(bound)),))
+                    lines.append(f"{name}_bucket{bucket_labels} {count}")
+                bucket_labels = self._labels(labels + (("le", "+Inf"),))
+                lines.append(f"{name}_bucket{bucket_labels} {histogram[-1]}")
+                lines.append(f"{name}_sum{self._labels(labels)} {histogram[-2]}")
+                lines.append(f"{name}_count{self._labels(labels)} {histogram[-1]}")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _labels(labels):
+        if not labels:
+            return ""
+        values = ",".join(
+            '{}="{}"'.format(
+                key,
+                str(value)
+                .replace("\\", "\\\\")
+                .replace('"', '\\"')
+                .replace("\n", "\\n"),
+            )
+            for key, value in labels
+        )
+        return f"{{{values}}}"
+
+
+# Shared by all apps and scrapers of this process
+METRICS = Metrics()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    """Serves METRICS on /metrics"""
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+
+        body = METRICS.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(port, host="127.0.0.1"):
+    """Starts metrics endpoint in a background thread
+
+    Returns:
+        ThreadingHTTPServer: Running server, to be shut down by the caller
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    Thread(target=server.serve_forever, name="kospel-metrics", daemon=True).start()
+    return server
+
+
+class Span:
+    """Timed operation within a trace"""
+
+    def __init__(self, name, parent=None, attributes=None):
+        self.name = name
+        self.parent = parent
+        self.attributes = dict(attributes or {})
+        self.span_id = secrets.token_hex(8)
+        if parent:
+            self.trace_id = parent.trace_id
+            self.exporter = parent.exporter
+            # Spans of the trace are collected by its root
+            self.trace = parent.trace
+        else:
+            self.trace_id = secrets.token_hex(16)
+            self.exporter = None
+            self.trace = []
+        self.start_time = time_ns()
+        self.end_time = None
+        self.error = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def end(self, error=None):
+        self.end_time = time_ns()
+        self.error = error
+        self.trace.append(self)
+        if self.parent is None and self.exporter:
+            self.exporter.export(self.trace)
+
+    def to_otlp(self):
+        """Span in OTLP/JSON layout"""
+        status = {"code": 1}
+        if self.error is not None:
+            status = {"code": 2, "message": f"{type(self.error).__name__}: {self.error}"}
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent.span_id if self.parent else "",
+            "name": self.name,
+            "startTimeUnixNano": str(self.start_time),
+            "endTimeUnixNano": str(self.end_time),
+            "attributes": [
+                {"key": key, "value": self._otlp_value(value)}
+                for key, value in self.attributes.items()
+            ],
+            "status": status,
+        }
+
+    @staticmethod
+    def _otlp_value(value):
+        if isinstance(value, bool):
+            return {"boolValue": value}
+        if isinstance(value, int):
+            return {"intValue": str(value)}
+        if isinstance(value, float):
+            return {"doubleValue": value}
+        return {"stringValue": str(value)}
+
+
+class Tracer:
+    """Creates spans. Does nothing until exporter is set"""
+
+    def __init__(self):
+        self.exporter = None
+        self._current = ContextVar("kospel_span", default=None)
+
+    def start(self, name, **attributes):
+        """Starts a root span, to be ended by the caller. None when disabled"""
+        if self.exporter is None:
+            return None
+        span = Span(name, attributes=attributes)
+        span.exporter = self.exporter
+        return span
+
+    @contextmanager
+    def use(self, span):
+        """Makes the span parent of spans started in the block"""
+        token = self._current.set(span)
+        try:
+            yield span
+        finally:
+            self._current.reset(token)
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """Child span of the current one. Skipped outside of a trace"""
+        parent = self._current.get()
+        if parent is None:
+            yield None
+            return
+
+        span = Span(name, parent, attributes)
+        token = self._current.set(span)
+        try:
+            yield span
+        except BaseException as error:
+            span.end(error)
+            raise
+        else:
+            span.end()
+        finally:
+            self._current.reset(token)
+
+    def set_attribute(self, key, value):
+        """Sets attribute of the current span"""
+        span = self._current.get()
+        if span is not None:
+            span.set_attribute(key, value)
+
+
+class FileSpanExporter:
+    """Appends finished traces to a file, one OTLP/JSON span per line"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = Lock()
+
+    def export(self, spans):
+        lines = "".join(json.dumps(span.to_otlp()) + "\n" for span in spans)
+        with self._lock, open(self.path, "a", encoding="utf-8") as file:
+            file.write(lines)
+
+
+class OtlpSpanExporter:
+    """Sends finished traces to OTLP/HTTP collector (JSON encoding)
+
+    e.g. http://localhost:4318/v1/traces
+    """
+
+    def __init__(self, url, log_function=None, timeout=5):
+        self.url = url
+        self.timeout = timeout
+        self.log = log_function or (lambda x: None)
+
+    def export(self, spans):
+        body = {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [
+                            {"key": "service.name", "value": {"stringValue": "kospel"}}
+                        ]
+                    },
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": "kospel"},
+                            "spans": [span.to_otlp() for span in spans],
+                        }
+                    ],
+                }
+            ]
+        }
+        # Collector must not slow down the cycle
+        Thread(target=self._send, args=(json.dumps(body).encode(),), daemon=True).start()
+
+    def _send(self, data):
+        request = Request(
+            self.url, data=data, headers={"Content-Type": "application/json"}
+        )
+        try:
+            with urlopen(request, timeout=self.timeout):
+                pass
+        except OSError as error:
+            self.log(f"Unable to export traces: {error}")
+
+
+# Shared by all apps and scrapers of this process
+TRACER = Tracer()
+
+
+class CaptureBuffer:
+    """Evidence of failed and slow cycles, kept on disk
+
+    Files are written by a background thread. Oldest files are removed
+    when the directory grows over max_bytes
     """
-    We now have a lock object that will be used to synchronize threads during
-    first access to the Singleton.
+
+    def __init__(self, directory, max_bytes=50 * 1024 * 1024, log_function=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.log = log_function or (lambda x: None)
+        self._queue = queue.Queue(maxsize=10)
+        self._counter = 0
+        os.makedirs(directory, exist_ok=True)
+        Thread(target=self._writer, name="kospel-capture", daemon=True).start()
+
+    def put(self, evidence):
+        """Queues evidence (dict) for writing. Never blocks"""
+        try:
+            self._queue.put_nowait(evidence)
+        except queue.Full:
+            self.log("Capture queue is full, dropping capture")
+
+    def _writer(self):
+        while True:
+            evidence = self._queue.get()
+            try:
+                self._write(evidence)
+                self._trim()
+            except OSError as error:
+                self.log(f"Unable to write capture: {error}")
+
+    def _write(self, evidence):
+        self._counter += 1
+        # Names sort by time, which is the removal order
+        prefix = os.path.join(
+            self.directory, f"{time_ns() // 1_000_000:013d}_{self._counter % 1000:03d}"
+        )
+        page_source = evidence.pop("page_source", None)
+        screenshot = evidence.pop("screenshot", None)
+
+        with open(f"{prefix}.json", "w", encoding="utf-8") as file:
+            json.dump(evidence, file, indent=2)
+        if page_source:
+            with open(f"{prefix}.html", "w", encoding="utf-8") as file:
+                file.write(page_source)
+        if screenshot:
+            with open(f"{prefix}.png", "wb") as file:
+                file.write(screenshot)
+
+    def _trim(self):
+        """Removes oldest captures (all files of each) over the size limit"""
+        captures = {}
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            captures.setdefault(name.split(".")[0], []).append(path)
+
+        total = sum(
+            os.path.getsize(path) for paths in captures.values() for path in paths
+        )
+        for prefix in sorted(captures):
+            if total <= self.max_bytes:
+                break
+            for path in captures[prefix]:
+                total -= os.path.getsize(path)
+                os.remove(path)
+
+
+class ScraperRegistry:
+    """Scrapers shared between apps
+
+    Apps with identical connection settings get the same scraper, others
+    get their own. Scraper is closed when its last user closes it
     """
 
-    def __call__(cls, *args, **kwargs):
+    _entries = {}
+    _lock: Lock = Lock()
+    """Guards _entries only. Scrapers are created under their own lock"""
+
+    @classmethod
+    def acquire(cls, key, factory):
+        """Returns a scraper for the connection
+
+        Args:
+            key (tuple): Connection identity
+            factory (callable): Creates the scraper when there is none yet
+
+        Returns:
+            SharedScraper: Scraper wrapper to be closed by the user
         """
-        Possible changes to the value of the `__init__` argument do not affect
-        the returned instance.
+        with cls._lock:
+            entry = cls._entries.get(key)
+            if entry is None:
+                entry = cls._entries[key] = SharedScraper(key)
+            entry.users += 1
+
+        try:
+            entry.start(factory)
+        except Exception:
+            cls.release(key)
+            raise
+        return entry
+
+    @classmethod
+    def release(cls, key):
+        """Drops one user of the scraper
+
+        Returns:
+            SharedScraper: Entry to be closed when it was the last user, else None
         """
-        # Now, imagine that the program has just been launched. Since there's no
-        # Singleton instance yet, multiple threads can simultaneously pass the
-        # previous conditional and reach this point almost at the same time. The
-        # first of them will acquire lock and will proceed further, while the
-        # rest will wait here.
         with cls._lock:
-            # The first thread to acquire the lock, reaches this conditional,
-            # goes inside and creates the Singleton instance. Once it leaves the
-            # lock block, a thread that might have been waiting for the lock
-            # release may then enter this section. But since the Singleton field
-            # is already initialized, the thread won't create a new object.
-            if cls not in cls._instances:
-                instance = super().__call__(*args, **kwargs)
-                cls._instances[cls] = instance
-        return cls._instances[cls]
-
-
-class WebScrap(metaclass=SingletonMeta):
+            entry = cls._entries.get(key)
+            if entry is None:
+                return None
+            entry.users -= 1
+            if entry.users > 0:
+                return None
+            del cls._entries[key]
+        return entry
+
+
+class SharedScraper:
+    """Scraper handed out by ScraperRegistry
+
+    Calls are serialized since several apps may use the same scraper
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.users = 0
+        self.scraper = None
+        self._lock = Lock()
+        # Groups to refresh, applied when the next run() starts
+        self._forced = set()
+        self._forced_lock = Lock()
+
+    def __getattr__(self, name):
+        # Everything else comes from the scraper itself
+        if name == "scraper":
+            raise AttributeError(name)
+        return getattr(self.scraper, name)
+
+    def start(self, factory):
+        """Creates the scraper if it does not exist yet"""
+        with self._lock:
+            if self.scraper is None:
+                self.scraper = factory()
+
+    def run(self):
+        with self._lock:
+            with self._forced_lock:
+                forced, self._forced = self._forced, set()
+            for group in forced:
+                self.scraper.refresh(group)
+            return self.scraper.run()
+
+    def stop(self):
+        with self._lock:
+            self.scraper.stop()
+
+    def reset(self):
+        with self._lock:
+            self.scraper.reset()
+
+    def refresh(self, group=None):
+        """Doesn't wait for a cycle in progress, see run()"""
+        with self._forced_lock:
+            self._forced.update([group] if group else RefreshTiers.GROUPS)
+
+    def close(self):
+        """Closes the scraper if nobody else uses it"""
+        if ScraperRegistry.release(self.key) is None:
+            return
+
+        with self._lock:
+            if self.scraper is not None:
+                self.scraper.close()
+
+
+class WebScrap:
     """Scrapping data from Kospel Home Assistant module"""
 
     STATUS = [
@@ -350,15 +1676,117 @@ class WebScrap(metaclass=SingletonMeta):
         "params_flow",  # Przeplyw
     ]
 
-    def __init__(self, url, username, password, exec_path, log_function=None):
+    # Chrome's own default, when the cycle budget does not limit it
+    PAGE_LOAD_TIMEOUT = 300
+
+    # Recovery steps from the cheapest. "retry" only reads again
+    RECOVERY = ("retry", "main_page", "reload", "login")
+    # First step worth trying for a failure
+    RECOVERY_FROM = (
+        (ElementMissing, 0),
+        (NavigationTimeout, 1),
+        (SessionExpired, 3),
+    )
+
+    # Reads many elements in a single WebDriver round-trip
+    # arguments[0]: ids to read "fill" style of
+    # arguments[1]: ids to read text of
+    # Elements which are not found are left out of the result
+    BATCH_SCRIPT = """
+        var read = function (ids, getter) {
+            var values = {};
+            ids.forEach(function (id) {
+                var element = document.getElementById(id);
+                if (element) {
+                    values[id] = getter(element);
+                }
+            });
+            return values;
+        };
+        return {
+            fill: read(arguments[0], function (element) {
+                return window.getComputedStyle(element).fill;
+            }),
+            text: read(arguments[1], function (element) {
+                // SVG elements have no innerText
+                var text = element.innerText;
+                return (text === undefined ? element.textContent : text).trim();
+            }),
+        };
+    """
+
+    def __init__(
+        self,
+        url,
+        username,
+        password,
+        exec_path,
+        log_function=None,
+        batched=False,
+        params_refresh=None,
+        session_file=None,
+        standby=False,
+        device=0,
+        capture=None,
+        capture_budget=None,
+        refresh=None,
+        cycle_budget=None,
+        tune_waits=True,
+        tuning_file=None,
+    ):
         """Initialize selenium driver with all required options
         Set which parameters should be read
+
+        Args:
+            batched (bool, optional): Read all elements of a page with one
+            script call instead of one call per element. Defaults to False.
+            params_refresh (str, optional): Panel's JavaScript which fills
+            in the parameters table. When given, parameters are read
+            without leaving the main page. Defaults to None.
+            session_file (str, optional): Path where session cookies are
+            kept between restarts. Defaults to None.
+            standby (bool, optional): Keep a second, logged in driver ready
+            to take over on reset(). Defaults to False.
+            device (int, optional): Position of the device on the panel's
+            device list. Defaults to 0.
+            capture (CaptureBuffer, optional): Where page source and
+            screenshot are stored when a cycle fails. Defaults to None.
+            capture_budget (float, optional): Cycles longer than this
+            many seconds are captured too. Defaults to None.
+            refresh (dict, optional): Data group => read every that many
+            cycles, see RefreshTiers. Defaults to None (read everything).
+            cycle_budget (float, optional): Seconds a cycle can spend
+            waiting in total. Defaults to None (unlimited).
+            tune_waits (bool, optional): Learn wait timeouts and poll
+            intervals, see WaitTuner. Defaults to True.
+            tuning_file (str, optional): File to keep wait durations in
+            across restarts. Defaults to None.
         """
         self.url = url
         self.username = username
         self.password = password
         self.logged_in = False
         self.exec_path = exec_path
+        self.batched = batched
+        self.params_refresh = params_refresh
+        self.session_file = session_file
+        self.module_url = None
+        self.standby = standby
+        self.device = device
+        self.stats = LatencyStats()
+        self.capture = capture
+        self.capture_budget = capture_budget
+        self._captured = False
+        self.tiers = RefreshTiers(refresh)
+        self.cycle_budget = cycle_budget
+        self.deadline = Deadline()
+        self.tuner = WaitTuner(
+            tuning_file, enabled=tune_waits, log_function=log_function
+        )
+        self._standby = None
+        self._standby_thread = None
+        self._standby_lock = Lock()
+        self._closed = False
 
         if log_function:
             self.log = log_function
@@ -367,45 +1795,279 @@ class WebScrap(metaclass=SingletonMeta):
             self.log = lambda x: None
 
         self._build_driver()
+        if self.standby:
+            self._spawn_standby()
 
     def stop(self):
         """Closes web driver"""
         try:
-            self.driver.quit()
+            if self.standby:
+                # Standby driver takes over, don't wait for this one to close
+                Thread(target=self.driver.quit, daemon=True).start()
+            else:
+                self.driver.quit()
         finally:
             self.logged_in = False
 
+    def close(self):
+        """Closes web driver and the standby one"""
+        with self._standby_lock:
+            self._closed = True
+            standby, self._standby = self._standby, None
+        self.tuner.save(force=True)
+        try:
+            self.stop()
+        finally:
+            if standby:
+                standby.driver.quit()
+
     def reset(self):
         """Re-initializes the webdriver"""
+        METRICS.inc("kospel_driver_rebuilds_total")
         self.stop()
-        self._build_driver()
 
+        with self._standby_lock:
+            self._closed = False
+            standby, self._standby = self._standby, None
+
+        if standby:
+            self.log("Switching to standby driver")
+            self.driver = standby.driver
+            self.module_url = standby.module_url
+            self.logged_in = True
+        else:
+            self._build_driver()
+
+        if self.standby:
+            self._spawn_standby()
+
+    def _spawn_standby(self):
+        """Builds another driver in the background and parks it on main page"""
+        if self._standby or (self._standby_thread and self._standby_thread.is_alive()):
+            return
+
+        def build():
+            # Only login matters; stats and caches of its own, so that
+            # background logins do not show up in the live ones
+            standby = None
+            try:
+                standby = WebScrap(
+                    self.url,
+                    self.username,
+                    self.password,
+                    self.exec_path,
+                    log_function=self.log,
+                    session_file=self.session_file,
+                    device=self.device,
+                )
+                if not standby._restore_session():
+                    standby._login_and_navigate()
+            except Exception as error:
+                self.log(f"Unable to prepare standby driver: {error}")
+                if standby is not None:
+                    try:
+                        standby.driver.quit()
+                    except Exception:
+                        pass
+                return
+
+            with self._standby_lock:
+                if not self._closed:
+                    self._standby = standby
+                    return
+            # Closed in the meantime
+            standby.driver.quit()
+
+        self._standby_thread = Thread(target=build, daemon=True)
+        self._standby_thread.start()
+
+    @timed("cycle")
     def run(self):
         """Collect data from web portal
 
+        Failures are recovered with the cheapest step that fits them,
+        escalating when it does not help (see RECOVERY). Driver rebuild,
+        the last step, is left to the caller's reset()
+
         returns (dict, dict): dictionary with statuses and parameters
         """
+        self.stats.start_cycle()
+        self._captured = False
+        self.deadline = Deadline(self.cycle_budget)
+        # Once per cycle, recovery runs _run() again within the same one
+        self.tiers.start_cycle()
+        start = monotonic()
+        rung = 0
+        step = None
+        while True:
+            try:
+                if step:
+                    self._recover(step)
+                result = self._run()
+                break
+            except Exception as error:
+                if isinstance(error, WebDriverException):
+                    error = self._classify(error)
+                # Page as it was at the first failure
+                self._capture(
+                    f"{type(error).__name__}: {error}",
+                    # Hung driver would block on every call
+                    from_driver=not isinstance(
+                        error, (BrowserCrashed, DeadlineExceeded)
+                    ),
+                )
+
+                first = next(
+                    (
+                        index
+                        for kind, index in self.RECOVERY_FROM
+                        if isinstance(error, kind)
+                    ),
+                    len(self.RECOVERY),
+                )
+                rung = max(rung, first)
+                if rung >= len(self.RECOVERY):
+                    self.tuner.save()
+                    raise error
+                step = self.RECOVERY[rung]
+                rung += 1
+                self.log(f"{type(error).__name__}: {error}. Recovery: {step}")
+
+        self.tuner.save()
+        if self.capture_budget and monotonic() - start > self.capture_budget:
+            self._capture(f"Slow cycle: {monotonic() - start:.1f}s")
+        return result
+
+    def _run(self):
         # Check if current page is already "main"
         home_element = self._find_element(by=By.ID, value="path7")
         if home_element:
             self.logged_in = True
         else:
             self.logged_in = False
-            self._login_and_navigate()
+            if not self._restore_session():
+                self._login_and_navigate()
 
         if not self.logged_in:
-            raise PermissionError("Not logged in!")
+            raise SessionExpired("Not logged in!")
+
+        # Groups which are not due this cycle are served from cache
+        tiers = self.tiers
+        read_params = tiers.due("params")
+
+        if self.params_refresh and read_params:
+            # Parameters table gets filled in while we read the main page
+            self._refresh_params()
 
         # Reading data
-        result_status = self._read_status()
-        result_settings = self._read_settings()
-        self._goto_params_page()
-        result_params = self._read_params()
+        if self.batched:
+            if tiers.due("status") or tiers.due("settings"):
+                result_status, result_settings = self._read_main_batched()
+                tiers.store("status", result_status)
+                tiers.store("settings", result_settings)
+        else:
+            if tiers.due("status"):
+                tiers.store("status", self._read_status())
+            if tiers.due("settings"):
+                tiers.store("settings", self._read_settings())
+
+        if not read_params:
+            pass
+        elif self.params_refresh:
+            # Table is hidden so its text is available only to the script
+            self._await_params_filled()
+            tiers.store("params", self._read_params_batched())
+        else:
+            self._goto_params_page()
+            if self.batched:
+                tiers.store("params", self._read_params_batched())
+            else:
+                tiers.store("params", self._read_params())
+
+            # Navigate back to main page
+            self._back_to_main()
+
+        return tiers.result()
+
+    def refresh(self, group=None):
+        """Reads the data group (or all of them) in the next cycle"""
+        self.tiers.refresh(group)
+
+    def _classify(self, error):
+        """Maps WebDriver exception not handled by the helpers to a failure kind"""
+        message = f"{type(error).__name__}: {error.msg}"
+        if isinstance(
+            error,
+            (
+                NoSuchElementException,
+                StaleElementReferenceException,
+                ElementNotInteractableException,
+            ),
+        ):
+            failure = ElementMissing(message)
+        elif isinstance(error, (TimeoutException, JavascriptException)):
+            # Page functions are missing when the page is not loaded
+            failure = NavigationTimeout(message)
+        else:
+            failure = BrowserCrashed(message)
+        failure.__cause__ = error
+        return failure
+
+    def _recover(self, step):
+        """Brings the page back to where reading can start again
 
-        # Navigate back to main page
-        self._back_to_main()
+        Args:
+            step (str): One of RECOVERY
+        """
+        METRICS.inc("kospel_recoveries_total", step=step)
+        with TRACER.span("recover", step=step):
+            if step == "main_page":
+                self.driver.execute_script("loadModule('101','19');")
+                self._await_main_page()
+            elif step == "reload":
+                if not self.module_url:
+                    raise SessionExpired("Device page not known, login needed")
+                self._get_page(self.module_url)
+                self._goto_module()
+                self._await_main_page()
+            elif step == "login":
+                self.logged_in = False
+                if self.session_file:
+                    self._forget_session()
+                self._login_and_navigate()
+
+    def _capture(self, reason, from_driver=True):
+        """Stores page source, screenshot and phase timings of this cycle
+
+        Only reading happens here, files are written in the background
 
-        return result_status, result_params, result_settings
+        Args:
+            from_driver (bool, optional): Read URL, page source and
+            screenshot from the driver. Defaults to True.
+        """
+        if self.capture is None or self._captured:
+            return
+        self._captured = True
+
+        evidence = {
+            "reason": reason,
+            "url": None,
+            "phases": dict(self.stats.current),
+            "page_source": None,
+            "screenshot": None,
+        }
+        if not from_driver:
+            self.capture.put(evidence)
+            return
+
+        # Driver may be already broken; take what is available
+        try:
+            evidence["url"] = self.driver.current_url
+            evidence["page_source"] = self.driver.page_source
+            evidence["screenshot"] = self.driver.get_screenshot_as_png()
+        except Exception as error:
+            self.log(f"Incomplete capture: {error}")
+        self.capture.put(evidence)
 
     def _build_driver(self):
         chrome_options = Options()
@@ -417,6 +2079,15 @@ class WebScrap(metaclass=SingletonMeta):
         service = Service(executable_path=self.exec_path)
         self.driver = webdriver.Chrome(service=service, options=chrome_options)
 
+        # Every WebDriver command (also of elements) goes through execute()
+        execute = self.driver.execute
+
+        def counted_execute(*args, **kwargs):
+            METRICS.inc("kospel_webdriver_roundtrips_total")
+            return execute(*args, **kwargs)
+
+        self.driver.execute = counted_execute
+
     def _login_and_navigate(self):
         """Navigates from login page to main apge"""
         self._login()
@@ -424,18 +2095,108 @@ class WebScrap(metaclass=SingletonMeta):
         self._goto_module()
         self._await_main_page()
         self.logged_in = True
+        self._save_session()
+
+    def _save_session(self):
+        """Stores cookies and selected device, so that next start can skip login"""
+        if not self.session_file:
+            return
+
+        session = {
+            "url": self.url,
+            "username": self.username,
+            "device": self.device,
+            "module_url": self.module_url,
+            "cookies": self.driver.get_cookies(),
+        }
+        try:
+            temp_file = f"{self.session_file}.tmp"
+            # Session cookies are as good as a password
+            fd = os.open(temp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w", encoding="utf-8") as file:
+                json.dump(session, file)
+            os.replace(temp_file, self.session_file)
+        except OSError as error:
+            self.log(f"Unable to save session: {error}")
+
+    @timed("restore_session")
+    def _restore_session(self):
+        """Re-uses session stored by _save_session()
+
+        Returns:
+            bool: True when main page is loaded, False when full login is needed
+        """
+        if not self.session_file or not os.path.exists(self.session_file):
+            return False
+
+        try:
+            with open(self.session_file, encoding="utf-8") as file:
+                session = json.load(file)
+        except (OSError, ValueError) as error:
+            self.log(f"Unable to read session: {error}")
+            return False
+
+        # Session of another panel, account or device must not be used
+        stored = (session.get("url"), session.get("username"), session.get("device"))
+        if stored != (self.url, self.username, self.device):
+            return False
+        if not session.get("module_url"):
+            return False
+
+        self.log("Restoring session")
+        # Cookies can be set only for currently loaded domain
+        self._get_page(self.url)
+        self.driver.delete_all_cookies()
+        for cookie in session.get("cookies", []):
+            self.driver.add_cookie(cookie)
+
+        self._get_page(session["module_url"])
+        try:
+            self._wait_until(
+                "start", EC.presence_of_element_located((By.ID, "start")), 7, 0.5
+            )
+            self.driver.execute_script("loadModule('101','19');")
+            self._wait_until(
+                "path7", EC.presence_of_element_located((By.ID, "path7")), 7, 0.5
+            )
+        except (TimeoutException, JavascriptException):
+            self.deadline.check()
+            self.log("Session rejected")
+            self._forget_session()
+            return False
+
+        self.module_url = session["module_url"]
+        self.logged_in = True
+        return True
+
+    def _forget_session(self):
+        try:
+            os.remove(self.session_file)
+        except OSError:
+            pass
 
     def _get_page(self, url):
         """Loads URL content and handles potential errors"""
         try:
+            # Page load (also one started by a click) waits within the budget
+            self.driver.set_page_load_timeout(
+                self.deadline.timeout(self.PAGE_LOAD_TIMEOUT)
+            )
             self.driver.get(url)
-        except Exception as error:
-            self.stop()
-            raise ConnectionError(f"Unable to reach URL: {url}") from error
-
+        except TimeoutException as error:
+            self.deadline.check()
+            raise NavigationTimeout(f"Timeout when loading URL: {url}") from error
+        except WebDriverException as error:
+            if "net::ERR_" in (error.msg or ""):
+                # Browser is fine, the panel does not answer
+                raise PanelDown(f"Unable to reach URL: {url}") from error
+            raise self._classify(error) from error
+
+    @timed("login")
     def _login(self):
         """Service login page"""
         self.log("Logging in")
+        METRICS.inc("kospel_logins_total")
         # Read login page into the driver
         self._get_page(self.url)
 
@@ -450,28 +2211,35 @@ class WebScrap(metaclass=SingletonMeta):
         )
         zaloguj.click()
 
+    @timed("goto_device")
     def _goto_device(self):
         """Select a device (after login)"""
         self._wait_for_element(by=By.CLASS_NAME, value="ui-body")
 
         # Page contains list with available devices
-        # I assume here that there is only one device
         elements = self._find_elements(by=By.TAG_NAME, value="li", required=True)
-        elements[0].click()
+        if self.device >= len(elements):
+            raise ReferenceError(f"Device {self.device} not found")
+        elements[self.device].click()
 
+    @timed("goto_module")
     def _goto_module(self):
         """Selects a module in the device.
         We're interested in management module
         """
         self._wait_for_element(by=By.ID, value="start")
+        # Device is selected at this point; remembered for session restore
+        self.module_url = self.driver.current_url
         self.driver.execute_script(
             "loadModule('101','19');"
         )  # TODO check if this is OK
 
+    @timed("await_main_page")
     def _await_main_page(self):
         # Path7 is "home image"
         self._wait_for_element(by=By.ID, value="path7")
 
+    @timed("read_status")
     def _read_status(self):
         """Status of services is encoded in icons' colors"""
         status = {}
@@ -486,6 +2254,7 @@ class WebScrap(metaclass=SingletonMeta):
 
         return status
 
+    @timed("read_settings")
     def _read_settings(self):
         settings = {}
         for setting in self.SETTINGS:
@@ -495,6 +2264,7 @@ class WebScrap(metaclass=SingletonMeta):
 
         return settings
 
+    @timed("goto_params_page")
     def _goto_params_page(self):
         """Parameters table is loaded into DOM at the beginning
         But the values get populated only when it's opened by the user
@@ -506,12 +2276,53 @@ class WebScrap(metaclass=SingletonMeta):
 
         # Wait for values to be filled in
         try:
-            WebDriverWait(self.driver, timeout=10, poll_frequency=1).until(
-                EC.visibility_of_element_located((By.ID, "params_temp_in"))
+            self._wait_until(
+                "params_page",
+                EC.visibility_of_element_located((By.ID, "params_temp_in")),
+                10,
+                1,
             )
         except TimeoutException as err:
-            raise ConnectionError("Timeout when opening params page") from err
+            self.deadline.check()
+            raise NavigationTimeout("Timeout when opening params page") from err
 
+    @timed("refresh_params")
+    def _refresh_params(self):
+        """Fills in parameters table without opening the params page
+
+        Cells are emptied first, so that values of the previous cycle
+        are not taken for fresh ones
+        """
+        try:
+            self.driver.execute_script(
+                "arguments[0].forEach(function (id) {"
+                "    var element = document.getElementById(id);"
+                "    if (element) { element.textContent = ''; }"
+                "});" + self.params_refresh,
+                self.PARAMS,
+            )
+        except JavascriptException as error:
+            raise NavigationTimeout("Unable to refresh params") from error
+
+    @timed("await_params_filled")
+    def _await_params_filled(self):
+        """Waits for values in the (hidden) parameters table"""
+        try:
+            self._wait_until(
+                "params_filled",
+                lambda driver: driver.execute_script(
+                    "var element = document.getElementById(arguments[0]);"
+                    "return element && element.textContent.trim();",
+                    "params_temp_in",
+                ),
+                10,
+                0.5,
+            )
+        except TimeoutException as err:
+            self.deadline.check()
+            raise NavigationTimeout("Timeout when refreshing params") from err
+
+    @timed("read_params")
     def _read_params(self):
         """Read values from parameters page"""
 
@@ -522,6 +2333,41 @@ class WebScrap(metaclass=SingletonMeta):
 
         return params
 
+    @timed("read_main")
+    def _read_main_batched(self):
+        """Same as _read_status() and _read_settings() in one round-trip"""
+        values = self._read_batch(
+            fill_ids=[f"{icon}_" for icon in self.STATUS], text_ids=self.SETTINGS
+        )
+
+        status = {}
+        for icon in self.STATUS:
+            if f"{icon}_" not in values["fill"]:
+                raise ElementMissing(f"Required element {By.ID, f'{icon}_'} not found")
+            status[icon] = values["fill"][f"{icon}_"] or "rgb(0, 0, 0)"
+
+        return status, values["text"]
+
+    @timed("read_params")
+    def _read_params_batched(self):
+        """Same as _read_params() in one round-trip"""
+        values = self._read_batch(text_ids=self.PARAMS)
+        return {param: values["text"].get(param, "---") for param in self.PARAMS}
+
+    def _read_batch(self, fill_ids=(), text_ids=()):
+        """Reads elements by id with BATCH_SCRIPT
+
+        Returns:
+            dict: {"fill": {id: color}, "text": {id: text}}
+        """
+        try:
+            return self.driver.execute_script(
+                self.BATCH_SCRIPT, list(fill_ids), list(text_ids)
+            )
+        except JavascriptException as error:
+            raise ElementMissing("Unable to read elements") from error
+
+    @timed("back_to_main")
     def _back_to_main(self):
         """Click on "back" button and go to main page"""
         back_button = self._find_element(
@@ -537,15 +2383,41 @@ class WebScrap(metaclass=SingletonMeta):
     def _wait_for_element(self, by, value, timeout=7):
         """Waits for an element to be available and gets its value"""
         try:
-            element = WebDriverWait(
-                self.driver, timeout=timeout, poll_frequency=0.5
-            ).until(EC.presence_of_element_located((by, value)))
+            with TRACER.span("wait_for_element", element=value, timeout=timeout):
+                element = self._wait_until(
+                    value, EC.presence_of_element_located((by, value)), timeout, 0.5
+                )
         except TimeoutException as err:
-            self.stop()
-            raise ReferenceError(f"Timeout on waiting for ({by, value})") from err
+            self.deadline.check()
+            raise NavigationTimeout(f"Timeout on waiting for ({by, value})") from err
 
         return element
 
+    def _wait_until(self, name, condition, timeout, poll_frequency):
+        """WebDriverWait with timeout and poll interval tuned for this wait,
+        limited by what is left of the cycle budget
+
+        Args:
+            name (str): Wait the durations are learned for
+            timeout (float): Timeout until enough durations are known
+            poll_frequency (float): Poll interval until then
+        """
+        tuned = self.tuner.timeout(name, timeout)
+        timeout = self.deadline.timeout(tuned)
+        poll_frequency = self.tuner.poll_frequency(name, poll_frequency)
+        start = monotonic()
+        try:
+            result = WebDriverWait(
+                self.driver, timeout=timeout, poll_frequency=poll_frequency
+            ).until(condition)
+        except TimeoutException:
+            if timeout >= tuned:
+                # Panel got slower; timeouts follow it up
+                self.tuner.add(name, tuned)
+            raise
+        self.tuner.add(name, monotonic() - start)
+        return result
+
     def _find_element(self, by, value, required=False, interactible=False):
         """Gets element from the DOM
 
@@ -559,15 +2431,13 @@ class WebScrap(metaclass=SingletonMeta):
         except NoSuchElementException as error:
             element = None
             if required:
-                self.stop()
-                raise ReferenceError(
+                raise ElementMissing(
                     f"Required element {by, value} not found"
                 ) from error
         except ElementNotInteractableException as error:
             element = None
             if interactible:
-                self.stop()
-                raise ReferenceError(f"Element {by, value} not interactible") from error
+                raise ElementMissing(f"Element {by, value} not interactible") from error
         return element
 
     def _find_elements(self, by, value, required=False):
@@ -576,16 +2446,213 @@ class WebScrap(metaclass=SingletonMeta):
         except NoSuchElementException as error:
             elements = None
             if required:
-                self.stop()
-                raise ReferenceError(
+                raise ElementMissing(
                     f"Required elements {by, value} not found"
                 ) from error
 
         if required and not elements:
-            self.stop()
-            raise ReferenceError(f"Required elements {by, value} not found")
+            raise ElementMissing(f"Required elements {by, value} not found")
         return elements
 
 
+def _scrap_worker(connection, scrap_class, args, kwargs, capture_args=None):
+    """Main loop of ScrapProcess child process
+
+    Executes commands received from the parent. Results, exceptions,
+    log messages and metrics are sent back as (kind, payload) tuples
+    """
+    if hasattr(os, "setpgrp"):
+        # Own process group, so that the browser can be killed along with it
+        os.setpgrp()
+    lock = Lock()
+
+    def send(kind, payload):
+        with lock:
+            try:
+                connection.send((kind, payload))
+            except Exception:
+                # Payload can't be pickled (e.g. exotic exception)
+                connection.send((kind, RuntimeError(str(payload))))
+
+    def log(message):
+        send("log", str(message))
+
+    try:
+        if capture_args:
+            kwargs = {**kwargs, "capture": CaptureBuffer(*capture_args, log_function=log)}
+        scraper = scrap_class(*args, log_function=log, **kwargs)
+    except Exception as error:
+        send("error", error)
+        return
+
+    while True:
+        try:
+            command = connection.recv()
+        except EOFError:
+            # Parent is gone
+            command = ("close", ())
+
+        command, args = command
+        if command == "close":
+            scraper.close()
+            return
+
+        try:
+            result = getattr(scraper, command)(*args)
+        except Exception as error:
+            kind, result = "error", error
+        else:
+            kind = "result"
+        # Counted here, published by the parent's METRICS
+        send("metrics", METRICS.drain())
+        send(kind, result)
+
+
+class ScrapProcess:
+    """Runs a scraper (WebScrap) in a separate process
+
+    Hangs, crashes and memory growth of the browser stay out of AppDaemon.
+    The process is killed and started again when it doesn't answer in time
+    """
+
+    def __init__(
+        self,
+        scrap_class,
+        args,
+        kwargs,
+        log_function=None,
+        timeout=120,
+        capture_args=None,
+    ):
+        """
+        Args:
+            scrap_class (type): Scraper class to be created in the process
+            args (tuple): Positional arguments of the scraper
+            kwargs (dict): Keyword arguments of the scraper
+            timeout (int, optional): Seconds to wait for a result before
+            the process is killed. Defaults to 120.
+            capture_args (tuple, optional): Arguments of CaptureBuffer
+            created in the process. Defaults to None.
+        """
+        self.scrap_class = scrap_class
+        self.args = args
+        self.kwargs = kwargs
+        self.capture_args = capture_args
+        self.timeout = timeout
+        self.process = None
+        self.connection = None
+
+        if log_function:
+            self.log = log_function
+        else:
+            # empty function with one argument
+            self.log = lambda x: None
+
+        # Fresh interpreter; forking AppDaemon with its threads is not safe
+        self._context = multiprocessing.get_context("spawn")
+        self._start()
+
+    def run(self):
+        """Collect data from web portal in the child process
+
+        returns (dict, dict, dict): statuses, parameters and settings
+        """
+        return self._call("run")
+
+    def refresh(self, group=None):
+        """Reads the data group (or all of them) in the next cycle"""
+        self._call("refresh", group)
+
+    def stop(self):
+        """Kills the process together with its browser"""
+        if self.process is None:
+            return
+
+        if hasattr(os, "killpg"):
+            # Browser and driver are in the process group of the worker
+            try:
+                os.killpg(self.process.pid, signal.SIGKILL)
+            except (ProcessLookupError, PermissionError):
+                # Group is not there yet when the worker hasn't called setpgrp()
+                pass
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=10)
+        if self.process.is_alive():
+            self.log(f"Scraper process {self.process.pid} did not exit")
+        self.connection.close()
+        self.process = None
+        self.connection = None
+
+    def close(self):
+        """Lets the scraper close cleanly, then stops the process"""
+        if self.process is not None and self.process.is_alive():
+            try:
+                self.connection.send(("close", ()))
+            except OSError:
+                pass
+            self.process.join(timeout=10)
+        self.stop()
+
+    def reset(self):
+        """Starts a new process, after the old one closed its browser"""
+        METRICS.inc("kospel_driver_rebuilds_total")
+        self.close()
+        self._start()
+
+    def _start(self):
+        self.connection, child_connection = self._context.Pipe()
+        self.process = self._context.Process(
+            target=_scrap_worker,
+            args=(
+                child_connection,
+                self.scrap_class,
+                self.args,
+                self.kwargs,
+                self.capture_args,
+            ),
+            name="kospel-scraper",
+            daemon=True,
+        )
+        self.process.start()
+        child_connection.close()
+
+    def _call(self, command, *args):
+        """Sends command to the child and waits for its result"""
+        if self.process is None or not self.process.is_alive():
+            self.stop()
+            self._start()
+
+        try:
+            self.connection.send((command, args))
+        except OSError as error:
+            self.stop()
+            raise ConnectionError("Scraper process is not running") from error
+
+        deadline = monotonic() + self.timeout
+        while True:
+            remaining = deadline - monotonic()
+            if remaining <= 0 or not self.connection.poll(remaining):
+                self.stop()
+                raise ConnectionError(
+                    f"Scraper process did not answer within {self.timeout}s"
+                )
+
+            try:
+                kind, payload = self.connection.recv()
+            except (EOFError, OSError) as error:
+                self.stop()
+                raise ConnectionError("Scraper process died") from error
+
+            if kind == "log":
+                self.log(payload)
+            elif kind == "metrics":
+                METRICS.merge(*payload)
+            elif kind == "error":
+                raise payload
+            else:
+                return payload
+
+
 if __name__ == "__main__":
     addon = Kospel()
@@ -0,0 +1,207 @@
+"""Cycle benchmark against the local stand-in panel
+
+Runs the Kospel app (scraper and publishing to a fake Home Assistant)
+a number of times and reports per-phase latency percentiles as JSON.
+
+Usage:
+    python tools/benchmark.py --exec-path /usr/bin/chromedriver
+    python tools/benchmark.py --cycles 200 --latency 0.05 --batched
+"""
+import argparse
+from functools import wraps
+import json
+import os
+import sys
+import time
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import standin_server  # noqa: E402
+
+
+class FakeHass:
+    """Minimal stand-in for AppDaemon's hass.Hass"""
+
+    def __init__(self):
+        self.args = {}
+        self.states = {}
+        self.set_state_calls = 0
+        self.verbose = False
+
+    def log(self, message):
+        if self.verbose:
+            print(message, file=sys.stderr)
+
+    def set_state(self, entity_id, state=None, attributes=None):
+        self.set_state_calls += 1
+        self.states[entity_id] = (state, attributes)
+
+    def run_minutely(self, callback, start):
+        pass
+
+    def listen_event(self, callback, event, **kwargs):
+        pass
+
+    def run_in(self, callback, delay, **kwargs):
+        callback(kwargs)
+
+
+# AppDaemon is not needed; the app runs against FakeHass
+sys.modules["hass"] = types.SimpleNamespace(Hass=FakeHass)
+
+import kospel  # noqa: E402
+
+# Phase name: scraper methods measured as that phase
+PHASES = {
+    "login": ["_login", "_restore_session"],
+    "device": ["_goto_device"],
+    "module": ["_goto_module"],
+    "main_page": ["_await_main_page"],
+    "status": ["_read_status", "_read_main_batched"],
+    "settings": ["_read_settings"],
+    "params_navigation": [
+        "_goto_params_page",
+        "_refresh_params",
+        "_await_params_filled",
+    ],
+    "params": ["_read_params", "_read_params_batched"],
+    "back": ["_back_to_main"],
+}
+
+def percentile(values, percent):
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, round(percent / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def summary(values):
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values),
+    }
+
+
+def instrument(scraper, phases, cycle):
+    """Wraps scraper methods so that their time adds to cycle[phase]"""
+    for phase, methods in phases.items():
+        for method in methods:
+            if not hasattr(scraper, method):
+                continue
+
+            def timed(function, phase=phase):
+                @wraps(function)
+                def wrapper(*args, **kwargs):
+                    start = time.perf_counter()
+                    try:
+                        return function(*args, **kwargs)
+                    finally:
+                        cycle[phase] = cycle.get(phase, 0.0) + (
+                            time.perf_counter() - start
+                        )
+
+                return wrapper
+
+            setattr(scraper, method, timed(getattr(scraper, method)))
+
+
+def run(options):
+    server = None
+    url = options.url
+    if not url:
+        server = standin_server.serve(
+            latency=options.latency, jitter=options.jitter, seed=options.seed
+        )
+        url = server.url
+
+    app = kospel.Kospel()
+    app.verbose = options.verbose
+    app.args = {
+        "url": url,
+        "username": options.username,
+        "password": options.password,
+        "exec_path": options.exec_path,
+        "batched_read": options.batched,
+    }
+    if options.params_in_place:
+        app.args["params_refresh_script"] = "refreshParams();"
+    app.initialize()
+
+    scraper = app.web_scrap.scraper
+    cycle = {}
+    instrument(scraper, PHASES, cycle)
+
+    timings = {}
+    errors = {}
+    try:
+        for _ in range(options.cycles):
+            cycle.clear()
+            start = time.perf_counter()
+            data, error = app.scrape(app.name)
+            cycle["cycle"] = time.perf_counter() - start
+
+            calls = app.set_state_calls
+            start = time.perf_counter()
+            app.process_result(data, error, name=app.name)
+            cycle["publish"] = time.perf_counter() - start
+
+            if error is not None:
+                name = type(error).__name__
+                errors[name] = errors.get(name, 0) + 1
+
+            for phase, seconds in cycle.items():
+                timings.setdefault(phase, []).append(seconds)
+            timings.setdefault("set_state_calls", []).append(
+                app.set_state_calls - calls
+            )
+    finally:
+        app.terminate()
+        if server:
+            server.shutdown()
+
+    return {
+        "batched": options.batched,
+        "params_in_place": options.params_in_place,
+        "cycles": options.cycles,
+        "latency": options.latency,
+        "errors": errors,
+        "phases": {phase: summary(values) for phase, values in timings.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--exec-path", default="/usr/bin/chromedriver")
+    parser.add_argument("--cycles", type=int, default=20)
+    parser.add_argument("--batched", action="store_true")
+    parser.add_argument("--params-in-place", action="store_true")
+    parser.add_argument(
+        "--url", default=None, help="panel to use instead of the built-in stand-in"
+    )
+    parser.add_argument("--username", default="user@example.com")
+    parser.add_argument("--password", default="secret")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="seconds")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default=None, help="file; stdout by default")
+    parser.add_argument("--verbose", action="store_true")
+    options = parser.parse_args()
+
+    result = json.dumps(run(options), indent=2)
+    if options.output:
+        with open(options.output, "w", encoding="utf-8") as file:
+            file.write(result)
+    else:
+        print(result)
+
+
+if __name__ == "__main__":
+    main()
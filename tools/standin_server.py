@@ -0,0 +1,422 @@
+"""Local stand-in for Kospel Home Admin panel
+
+Serves a replica of the pages WebScrap walks through (login, device list,
+module start page, SVG main view, parameters table) and the endpoints
+their scripts call. Used for offline testing and benchmarks.
+
+Usage:
+    python tools/standin_server.py --port 8080 --latency 0.2
+"""
+import argparse
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import random
+import secrets
+from threading import Lock, Thread
+import time
+from urllib.parse import parse_qs, urlparse
+
+GREEN = "rgb(0, 170, 0)"
+RED = "rgb(255, 0, 0)"
+WHITE = "rgb(233, 233, 233)"
+GRAY = "rgb(133, 133, 133)"
+
+STATUS = ["radiator", "tap", "clock", "pump", "error", "suitcase"]
+
+LOGIN_PAGE = """<!DOCTYPE html>
+<html><head><title>Home Admin</title></head>
+<body>
+<form id="login_form" method="post" action="/login">
+  <input id="login" name="login" type="text">
+  <input id="pass" name="pass" type="password">
+  <a href="#" onclick="document.getElementById('login_form').submit(); return false;">zaloguj</a>
+</form>
+</body></html>
+"""
+
+DEVICES_PAGE = """<!DOCTYPE html>
+<html><head><title>Home Admin</title></head>
+<body>
+<div class="ui-body"><ul>{items}</ul></div>
+</body></html>
+"""
+
+MODULE_PAGE = """<!DOCTYPE html>
+<html><head><title>Home Admin</title></head>
+<body>
+<div id="start"></div>
+<div id="content"></div>
+<script>
+var device = "{device}";
+var refresh = {refresh};
+
+function post(path, data) {{
+    var form = new URLSearchParams();
+    Object.keys(data).forEach(function (key) {{ form.append(key, data[key]); }});
+    return fetch(path, {{method: "POST", body: form}}).then(function (response) {{
+        return response.json();
+    }});
+}}
+
+function loadModule(module, page) {{
+    fetch("/view/main?device=" + device).then(function (response) {{
+        return response.text();
+    }}).then(function (html) {{
+        document.getElementById("content").innerHTML = html;
+        updateMain();
+        setInterval(updateMain, refresh * 1000);
+    }});
+}}
+
+function updateMain() {{
+    post("/api/module", {{device: device, module: "101", page: "19"}})
+        .then(function (values) {{
+            Object.keys(values).forEach(function (id) {{
+                var element = document.getElementById(id);
+                if (!element) {{ return; }}
+                if (id.slice(-1) === "_") {{
+                    element.style.fill = values[id];
+                }} else {{
+                    element.textContent = values[id];
+                }}
+            }});
+        }});
+}}
+
+function refreshParams() {{
+    return post("/api/params", {{device: device, module: "101", page: "19"}})
+        .then(function (values) {{
+            Object.keys(values).forEach(function (id) {{
+                document.getElementById(id).textContent = values[id];
+            }});
+        }});
+}}
+
+function openParams() {{
+    // Table is shown once the values are there
+    refreshParams().then(function () {{
+        document.getElementById("params").style.display = "block";
+    }});
+}}
+
+function closeParams() {{
+    document.getElementById("params").style.display = "none";
+}}
+</script>
+</body></html>
+"""
+
+MAIN_VIEW = """
+<svg width="400" height="300">
+  <path id="path7" d="M10 10 H 390 V 290 H 10 Z" style="fill: none"></path>
+  {icons}
+  <text id="temp_prog" x="20" y="250">{temp_prog}</text>
+  <text id="temp_zas_nas" x="120" y="250">{temp_zas_nas}</text>
+  <text id="parameters_lbl_" x="300" y="250" onclick="openParams()">params</text>
+</svg>
+<div id="params" style="display: none">
+  <div><a href="#">menu</a><a href="#" onclick="closeParams(); return false;">back</a></div>
+  <table>{rows}</table>
+</div>
+"""
+
+
+class Device:
+    """Simulated heater. Values drift a bit on every read"""
+
+    def __init__(self, device_id, rng):
+        self.id = device_id
+        self.rng = rng
+        self.temp_room = 21.0
+        self.temp_outside = 5.0
+        self.temp_boil = 48.0
+        self.power = 0.0
+        self.temp_prog = 21.5
+        self.temp_zas_nas = 50.0
+
+    def step(self):
+        """Random walk of the readouts"""
+        self.temp_room += self.rng.uniform(-0.1, 0.1)
+        self.temp_outside += self.rng.uniform(-0.2, 0.2)
+        self.temp_boil += self.rng.uniform(-0.3, 0.3)
+        heating = self.temp_room < self.temp_prog
+        self.power = round(self.rng.uniform(2.0, 6.0), 1) if heating else 0.0
+
+    def module(self):
+        """Values of the main view: icon colors and settings"""
+        heating = self.power > 0
+        values = {
+            "radiator_": RED if heating else GREEN,
+            "tap_": RED if self.temp_boil < self.temp_zas_nas - 5 else GREEN,
+            "clock_": GRAY,
+            "pump_": RED if heating else WHITE,
+            "error_": WHITE,
+            "suitcase_": WHITE,
+        }
+        values["temp_prog"] = f"{self.temp_prog:.1f}°"
+        values["temp_zas_nas"] = f"{self.temp_zas_nas:.1f}°"
+        return values
+
+    def params(self):
+        """Values of the parameters table"""
+        return {
+            "params_temp_in": f"{self.temp_room + 10:.1f} °C",
+            "params_temp_out": f"{self.temp_room + 15:.1f} °C",
+            "params_temp_factor": f"{self.temp_prog + 20:.1f} °C",
+            "params_temp_room": f"{self.temp_room:.1f} °C",
+            "params_temp_outside": f"{self.temp_outside:.1f} °C",
+            "params_temp_boil": f"{self.temp_boil:.1f} °C",
+            "params_power": f"{self.power:.1f} kW",
+            "params_preasure": "1.5 bar",
+            "params_flow": f"{5.0 if self.power else 0.0:.1f} l/min",
+        }
+
+
+class Panel:
+    """State shared by all requests: accounts, sessions and devices"""
+
+    PARAMS = list(Device(0, random.Random()).params())
+
+    def __init__(
+        self,
+        username="user@example.com",
+        password="secret",
+        devices=1,
+        latency=0.0,
+        jitter=0.0,
+        refresh=5,
+        seed=None,
+    ):
+        """
+        Args:
+            latency (float, optional): Seconds added to every response
+            jitter (float, optional): Random extra seconds added to latency
+            refresh (int, optional): Main view refresh period in seconds
+            seed (int, optional): Seed of generated values
+        """
+        self.username = username
+        self.password = password
+        self.latency = latency
+        self.jitter = jitter
+        self.refresh = refresh
+        self.rng = random.Random(seed)
+        self.devices = [Device(f"dev{index}", self.rng) for index in range(devices)]
+        self.sessions = set()
+        self.lock = Lock()
+
+    def delay(self):
+        """Simulates network and panel latency"""
+        with self.lock:
+            extra = self.rng.uniform(0, self.jitter) if self.jitter else 0.0
+        if self.latency or extra:
+            time.sleep(self.latency + extra)
+
+    def login(self, username, password):
+        """Returns new session token or None"""
+        if username != self.username or password != self.password:
+            return None
+        token = secrets.token_hex(16)
+        with self.lock:
+            self.sessions.add(token)
+        return token
+
+    def device(self, device_id):
+        for device in self.devices:
+            if device.id == device_id:
+                return device
+        return None
+
+
+class Handler(BaseHTTPRequestHandler):
+    """Request handler. Panel is attached to the server"""
+
+    server_version = "KospelStandin/1.0"
+
+    @property
+    def panel(self):
+        return self.server.panel
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        self.panel.delay()
+        path = urlparse(self.path).path
+        if path == "/":
+            self._send_html(LOGIN_PAGE)
+        elif not self._session():
+            if path.startswith("/api/"):
+                self._send_json({"error": "unauthorized"}, status=401)
+            else:
+                self._redirect("/")
+        elif path == "/devices":
+            items = "".join(
+                f'<li><a href="/device/{device.id}">{device.id}</a></li>'
+                for device in self.panel.devices
+            )
+            self._send_html(DEVICES_PAGE.format(items=items))
+        elif path.startswith("/device/"):
+            device = self.panel.device(path[len("/device/") :])
+            if device is None:
+                self._send_error(404)
+            else:
+                self._send_html(
+                    MODULE_PAGE.format(device=device.id, refresh=self.panel.refresh)
+                )
+        elif path == "/view/main":
+            query = parse_qs(urlparse(self.path).query)
+            device = self.panel.device(query.get("device", [""])[0])
+            if device is None:
+                self._send_error(404)
+                return
+
+            with self.panel.lock:
+                values = device.module()
+            icons = "".join(
+                f'<circle id="{icon}_" cx="{30 + 50 * index}" cy="50" r="15"'
+                f' style="fill: {values[f"{icon}_"]}"></circle>'
+                for index, icon in enumerate(STATUS)
+            )
+            rows = "".join(
+                f'<tr><td>{param}</td><td id="{param}"></td></tr>'
+                for param in self.panel.PARAMS
+            )
+            self._send_html(
+                MAIN_VIEW.format(
+                    icons=icons,
+                    rows=rows,
+                    temp_prog=values["temp_prog"],
+                    temp_zas_nas=values["temp_zas_nas"],
+                )
+            )
+        elif path == "/api/devices":
+            self._send_json(
+                [{"id": device.id, "name": device.id} for device in self.panel.devices]
+            )
+        else:
+            self._send_error(404)
+
+    def do_POST(self):
+        self.panel.delay()
+        path = urlparse(self.path).path
+        length = int(self.headers.get("Content-Length") or 0)
+        form = {
+            key: values[0]
+            for key, values in parse_qs(self.rfile.read(length).decode()).items()
+        }
+
+        if path == "/login":
+            token = self.panel.login(form.get("login"), form.get("pass"))
+            if token is None:
+                self._send(403, LOGIN_PAGE, "text/html; charset=utf-8")
+            else:
+                # Device list is a new page, as after the real form
+                self._redirect("/devices", cookie=token)
+            return
+
+        if not self._session():
+            self._send_json({"error": "unauthorized"}, status=401)
+            return
+
+        device = self.panel.device(form.get("device"))
+        if device is None:
+            self._send_error(404)
+        elif path == "/api/module":
+            with self.panel.lock:
+                device.step()
+                values = device.module()
+            self._send_json(values)
+        elif path == "/api/params":
+            with self.panel.lock:
+                values = device.params()
+            self._send_json(values)
+        else:
+            self._send_error(404)
+
+    def _session(self):
+        cookie = SimpleCookie(self.headers.get("Cookie", ""))
+        token = cookie.get("session")
+        return token is not None and token.value in self.panel.sessions
+
+    def _send(self, status, body, content_type, headers=()):
+        data = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_html(self, html):
+        self._send(200, html, "text/html; charset=utf-8")
+
+    def _send_json(self, value, status=200):
+        self._send(status, json.dumps(value), "application/json")
+
+    def _send_error(self, status):
+        self._send(status, "", "text/plain")
+
+    def _redirect(self, location, cookie=None):
+        headers = [("Location", location)]
+        if cookie:
+            headers.append(("Set-Cookie", f"session={cookie}; Path=/"))
+        self._send(302, "", "text/plain", headers)
+
+
+def serve(host="127.0.0.1", port=0, verbose=False, **panel_options):
+    """Starts the server in a background thread
+
+    Args:
+        port (int, optional): 0 picks a free port
+        panel_options: Passed to Panel
+
+    Returns:
+        ThreadingHTTPServer: Running server; its URL is server.url
+    """
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    server.panel = Panel(**panel_options)
+    server.verbose = verbose
+    server.url = f"http://{host}:{server.server_address[1]}"
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--username", default="user@example.com")
+    parser.add_argument("--password", default="secret")
+    parser.add_argument("--devices", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="seconds")
+    parser.add_argument(
+        "--refresh", type=int, default=5, help="main view refresh period, seconds"
+    )
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    server.panel = Panel(
+        username=args.username,
+        password=args.password,
+        devices=args.devices,
+        latency=args.latency,
+        jitter=args.jitter,
+        refresh=args.refresh,
+        seed=args.seed,
+    )
+    server.verbose = True
+    print(f"Serving on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()